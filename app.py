@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
 # streamlit run app.py
 import os
-import json
-from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime, timedelta
+import stat
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from datetime import date, datetime, timedelta
 import re
+import bisect
+from functools import lru_cache
+from types import SimpleNamespace
+import numpy as np
+import orjson
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from dotenv import load_dotenv
 
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI, OpenAI
 except Exception as e:
     st.error("OpenAI SDK not found. Install with: pip install openai>=1.40 python-dotenv")
     raise
@@ -20,20 +29,6 @@ except Exception:
     st.error("Python 3.9+ with zoneinfo is required.")
     raise
 
-# ─────────────────────────────────────────────────────────────────────────────
-# OPTIONAL: LangSmith tracing (safe shim if not installed)
-# ─────────────────────────────────────────────────────────────────────────────
-try:
-    from langsmith import traceable, Client as LangsmithClient
-    HAS_LANGSMITH = True
-except Exception:
-    HAS_LANGSMITH = False
-    def traceable(*targs, **tkwargs):
-        def deco(fn):
-            return fn
-        return deco
-    LangsmithClient = None
-
 # ─────────────────────────────────────────────────────────────────────────────
 # Page config (early so Streamlit applies layout/theme right away)
 # ─────────────────────────────────────────────────────────────────────────────
@@ -44,8 +39,19 @@ st.set_page_config(page_title="Sunny Receptionist", page_icon="💇‍♀️", l
 # ─────────────────────────────────────────────────────────────────────────────
 load_dotenv()  # allow local .env for dev
 
+def _get_secret(key: str, env_name: str, default: Optional[str] = None) -> Optional[str]:
+    v = os.getenv(env_name)
+    if v not in (None, ""):
+        return v
+    try:
+        return st.secrets.get(key, default)
+    except Exception:
+        return default
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") or st.secrets.get("OPENAI_API_KEY", None)
 MODEL = os.getenv("OPENAI_MODEL") or st.secrets.get("OPENAI_MODEL", "gpt-5-chat-latest")
+# Faster/cheaper model for routine slot-filling turns (see _pick_model)
+MODEL_SMALL = _get_secret("OPENAI_MODEL_SMALL", "OPENAI_MODEL_SMALL", "gpt-4o-mini")
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME") or st.secrets.get("ADMIN_USERNAME", "owner")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD") or st.secrets.get("ADMIN_PASSWORD", "pass1")
 
@@ -53,32 +59,31 @@ BUSINESS_FILE = os.getenv("BUSINESS_INFO_FILE") or "business_info.json"
 SERVICES_FILE = os.getenv("SERVICES_FILE") or "services.json"
 WORKING_FILE = os.getenv("WORKING_HOURS_FILE") or "working_hours.json"
 CALENDAR_FILE = os.getenv("CALENDAR_FILE") or "calendar.json"  # holds existing appointments
-BOOKINGS_FILE = os.getenv("BOOKINGS_FILE") or "bookings.json"  # contact info records
+BOOKINGS_FILE = os.getenv("BOOKINGS_FILE") or "bookings.jsonl"  # contact info records (append-only JSONL)
 
 if not OPENAI_API_KEY:
     st.error("❌ Missing OPENAI_API_KEY. Set it as an environment variable or in .streamlit/secrets.toml")
     st.stop()
 
-client = OpenAI(api_key=OPENAI_API_KEY)
-
 # ─────────────────────────────────────────────────────────────────────────────
-# LangSmith env handling
+# OPTIONAL: LangSmith tracing (imported only when enabled; no-op shim otherwise)
 # ─────────────────────────────────────────────────────────────────────────────
-def _get_secret(key: str, env_name: str, default: Optional[str] = None) -> Optional[str]:
-    v = os.getenv(env_name)
-    if v not in (None, ""):
-        return v
-    try:
-        return st.secrets.get(key, default)
-    except Exception:
-        return default
-
 LANGCHAIN_TRACING_V2 = _get_secret("LANGCHAIN_TRACING_V2", "LANGCHAIN_TRACING_V2", "false")
 LANGCHAIN_API_KEY     = _get_secret("LANGCHAIN_API_KEY", "LANGCHAIN_API_KEY", None)
 LANGCHAIN_PROJECT     = _get_secret("LANGCHAIN_PROJECT", "LANGCHAIN_PROJECT", "Sunny Receptionist")
 LANGSMITH_ENDPOINT    = _get_secret("LANGSMITH_ENDPOINT", "LANGSMITH_ENDPOINT", None)
 
-if HAS_LANGSMITH and (LANGCHAIN_TRACING_V2 or "").lower() == "true" and LANGCHAIN_API_KEY:
+TRACING_ON = (LANGCHAIN_TRACING_V2 or "").lower() == "true" and bool(LANGCHAIN_API_KEY)
+
+HAS_LANGSMITH = False
+if TRACING_ON:
+    try:
+        from langsmith import traceable, Client as LangsmithClient
+        HAS_LANGSMITH = True
+    except Exception:
+        pass
+
+if HAS_LANGSMITH:
     os.environ["LANGCHAIN_TRACING_V2"] = "true"
     os.environ["LANGCHAIN_API_KEY"] = LANGCHAIN_API_KEY
     if LANGCHAIN_PROJECT:
@@ -88,6 +93,11 @@ if HAS_LANGSMITH and (LANGCHAIN_TRACING_V2 or "").lower() == "true" and LANGCHAI
     LS_CLIENT = LangsmithClient()
 else:
     LS_CLIENT = None
+    # Plain functions when tracing is off: no wrapper frame on every tool/LLM call
+    def traceable(*targs, **tkwargs):
+        def deco(fn):
+            return fn
+        return deco
 
 # ─────────────────────────────────────────────────────────────────────────────
 # System prompt (Sunny) — includes conversation loop directive
@@ -106,6 +116,7 @@ You are “Sunny,” a friendly, quick, and helpful AI receptionist for a neighb
 - `get_now` → current date/time in salon timezone.
 - `get_hours` → opening/closing hours for a given date (from working_hours.json + exceptions).
 - `check_availability` → ALWAYS before answering availability or booking; uses working_hours.json + calendar.json.
+- `check_availability_range` → availability for several consecutive days at once (e.g., “this week”).
 - `book_appointment` → AFTER user confirms date/time & shares contact; re-checks then writes to files.
 - `get_conversation_state` / `update_conversation_state` → read/update dialog slots (service, date, time, name, phone, email).
 - `internal_plan` → hidden planning scratchpad. Use it to outline steps; do not reveal to user.
@@ -117,7 +128,7 @@ You are “Sunny,” a friendly, quick, and helpful AI receptionist for a neighb
 
 ## Conversation Rules
 1) For opening/closing hours questions: call `get_hours` for the date (and `get_now` if you need to resolve “today/tomorrow”).
-2) On any availability request: call `get_now` (when needed) then `check_availability`.
+2) On any availability request: call `get_now` (when needed) then `check_availability`; for multi-day questions call `check_availability_range` once instead of one `check_availability` per day.
 3) Only offer a small set of slots (3–8) and a next step.
 4) When collecting contact info, ask for phone in +1XXXXXXXXXX format and email like name@example.com.
 5) When booking, summarize: service, date, time, duration, total price (if known). Collect name, phone, email. Then call `book_appointment`.
@@ -129,7 +140,7 @@ You are “Sunny,” a friendly, quick, and helpful AI receptionist for a neighb
 - services.json: Services list with name, duration (minutes), price, description.
 - working_hours.json: Scheduler config — timezone, slot_interval_minutes, weekly_hours, exceptions.
 - calendar.json: Booked appointments per date: { "YYYY-MM-DD": ["HH:MM-HH:MM", ...] }.
-- bookings.json: Client contact records for each booking (name, phone, email), separate from calendar.
+- bookings.jsonl: Client contact records for each booking (name, phone, email), separate from calendar.
 
 ## Output
 - Plain text. Short paragraphs. Bulleted lists for options.
@@ -140,19 +151,59 @@ You are “Sunny,” a friendly, quick, and helpful AI receptionist for a neighb
 REASONING_CONTROLLER = """
 You have a hidden tool called `internal_plan` for deliberate planning.
 For EACH user message:
-- First, CALL `internal_plan` once with a compact JSON plan:
+- CALL `internal_plan` once with a compact JSON plan:
   { "objective": "...", "steps": ["..."], "missing_info": ["..."], "tools_to_use": ["..."], "state_updates": { ... } }
-- Then execute the plan using other tools (`get_services`, `get_hours`, `check_availability`, `update_conversation_state`, etc.).
+  Emit it in the SAME assistant message as the first tools you need (parallel tool calls), never as a step of its own.
+  If the reply needs no tools at all, skip it and answer directly.
+- Execute the plan using other tools (`get_services`, `get_hours`, `check_availability`, `update_conversation_state`, etc.).
 - Finally, produce a short, user-facing reply (no mention of planning or tools).
 - Keep collecting state in order: service → date → time → name/phone/email → confirm.
 """.strip()
 
+# Static prefix sent first on every request. Keep it byte-identical across turns
+# (no dates/times interpolated) so the API's automatic prompt cache can reuse it;
+# live time comes from the `get_now` tool instead.
+SYSTEM_MESSAGES = (
+    {"role": "system", "content": SYSTEM_PROMPT},
+    {"role": "system", "content": REASONING_CONTROLLER},
+)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Fast JSON (orjson): every encode/decode in the app goes through these
+# ─────────────────────────────────────────────────────────────────────────────
+def _dumps(o: Any) -> str:
+    """Compact JSON string; orjson emits UTF-8 directly (no ensure_ascii escaping)."""
+    return orjson.dumps(o).decode()
+
+def _dumps_indented(o: Any) -> bytes:
+    """2-space indented UTF-8 JSON: the on-disk and editor format."""
+    return orjson.dumps(o, option=orjson.OPT_INDENT_2)
+
+_loads = orjson.loads
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Files: seed/ensure/load
 # ─────────────────────────────────────────────────────────────────────────────
 def _write_json(path: str, payload: Any):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2, ensure_ascii=False)
+    """Write to a temp file in the same directory, then os.replace: never a half-written file."""
+    tmp = f"{path}.{os.urandom(6).hex()}.tmp"
+    # 0o666 lets the kernel apply the umask, as a plain open() would for a new file
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_dumps_indented(payload))
+        try:
+            os.chmod(tmp, stat.S_IMODE(os.stat(path).st_mode))  # keep the target's mode
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def _is_jsonl(path: str) -> bool:
+    return path.endswith(".jsonl")
 
 def ensure_business_file(path: str):
     """Seed WITHOUT working hours or services."""
@@ -203,81 +254,162 @@ def ensure_calendar_file(path: str):
         _write_json(path, seed_calendar)
 
 def ensure_bookings_file(path: str):
-    if not os.path.exists(path):
+    if os.path.exists(path):
+        return
+    if not _is_jsonl(path):
         _write_json(path, {"bookings": []})
-
-@st.cache_data
-def load_business_info_cached(path: str) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-@st.cache_data
-def load_services_cached(path: str) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-@st.cache_data
-def load_working_cached(path: str) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-@st.cache_data
-def load_calendar_cached(path: str) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-@st.cache_data
-def load_bookings_cached(path: str) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        return
+    # One-time migration from the older single-document bookings.json, if present
+    legacy = os.path.splitext(path)[0] + ".json"
+    records: List[Dict[str, Any]] = []
+    if os.path.exists(legacy):
+        with open(legacy, "rb") as f:
+            records = _loads(f.read()).get("bookings", [])
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(_dumps(r) + "\n" for r in records)
+
+def _json_cache() -> Dict[str, Tuple[float, Any, Any]]:
+    """Per-session parsed-JSON cache: path -> (mtime, data, index)."""
+    if "_json_cache" not in st.session_state:
+        st.session_state["_json_cache"] = {}
+    return st.session_state["_json_cache"]
+
+def _load_json(path: str) -> Any:
+    """Parse `path` once per session; re-read only when its mtime changes."""
+    cache = _json_cache()
+    mtime = os.path.getmtime(path)
+    hit = cache.get(path)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    with open(path, "rb") as f:
+        if _is_jsonl(path):
+            data = [_loads(line) for line in f if line.strip()]
+        else:
+            data = _loads(f.read())
+    cache[path] = (mtime, data, _build_index(path, data))
+    _forget_derived(path)
+    return data
+
+def _store_json(path: str, data: Any, index: Any = None) -> None:
+    """Refresh the cache entry for a file we just wrote (no reparse); pass `index` if kept up to date."""
+    if index is None:
+        index = _build_index(path, data)
+    _json_cache()[path] = (os.path.getmtime(path), data, index)
+    _forget_derived(path)
+
+def _invalidate_json(path: str) -> None:
+    """Drop one file's cache entry; other files stay parsed."""
+    _json_cache().pop(path, None)
+    _forget_derived(path)
+
+def _forget_derived(path: str) -> None:
+    """Drop session values computed from `path` when its contents change."""
+    if path in (BUSINESS_FILE, WORKING_FILE):
+        st.session_state.pop("_salon_tz", None)
+
+def _json_index(path: str) -> Any:
+    """Derived lookup built alongside the cached data (None if not loaded)."""
+    hit = _json_cache().get(path)
+    return hit[2] if hit else None
+
+def _index_calendar(cal: Dict[str, Any]) -> Dict[str, Tuple[List[int], List[int]]]:
+    """
+    Per-date taken ranges in minutes: (starts, reach), sorted by start, where
+    reach[i] is the max end of spans 0..i (non-decreasing, so it can be bisected).
+    Also sorts each day's range strings in place (unparseable ones first) so they
+    stay aligned with `starts` for bisect inserts in `_append_appointment`.
+    """
+    index: Dict[str, Tuple[List[int], List[int]]] = {}
+    for date_str, ranges in (cal.get("appointments") or {}).items():
+        if not isinstance(ranges, list):
+            continue
+        keyed: List[Tuple[int, int, str]] = []
+        for r in ranges:
+            try:
+                rs, re_ = r.split("-")
+                keyed.append((_time_to_minutes(rs), _time_to_minutes(re_), r))
+            except Exception:
+                keyed.append((-1, -1, r))
+        keyed.sort(key=lambda k: k[0])
+        ranges[:] = [k[2] for k in keyed]
+        starts: List[int] = []
+        reach: List[int] = []
+        hi = -1
+        for rs_m, re_m, _r in keyed:
+            if rs_m < 0:
+                continue
+            hi = max(hi, re_m)
+            starts.append(rs_m)
+            reach.append(hi)
+        index[date_str] = (starts, reach)
+    return index
+
+def _index_services(data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Lowercased service name -> service entry (first one wins on duplicates)."""
+    by_name: Dict[str, Dict[str, Any]] = {}
+    for s in data.get("services", []) or []:
+        by_name.setdefault(str(s.get("name", "")).lower(), s)
+    return by_name
+
+def _build_index(path: str, data: Any) -> Any:
+    if path == CALENDAR_FILE:
+        return _index_calendar(data)
+    if path == SERVICES_FILE:
+        return _index_services(data)
+    return None
 
 def load_business_info(path: str) -> Dict[str, Any]:
     try:
         ensure_business_file(path)
-        return load_business_info_cached(path)
+        return _load_json(path)
     except Exception:
         return {}
 
 def load_services(path: str) -> Dict[str, Any]:
     try:
         ensure_services_file(path)
-        return load_services_cached(path)
+        return _load_json(path)
     except Exception:
         return {"services": []}
 
 def load_working(path: str) -> Dict[str, Any]:
     try:
         ensure_working_file(path)
-        return load_working_cached(path)
+        return _load_json(path)
     except Exception:
         return {}
 
 def load_calendar(path: str) -> Dict[str, Any]:
     try:
         ensure_calendar_file(path)
-        return load_calendar_cached(path)
+        return _load_json(path)
     except Exception:
         return {"appointments": {}}
 
 def load_bookings(path: str) -> Dict[str, Any]:
     try:
         ensure_bookings_file(path)
-        return load_bookings_cached(path)
+        data = _load_json(path)
+        return {"bookings": data} if isinstance(data, list) else data
     except Exception:
         return {"bookings": []}
 
-def _save_calendar(cal: Dict[str, Any]) -> None:
+def _save_calendar(cal: Dict[str, Any], index: Any = None) -> None:
     try:
-        with open(CALENDAR_FILE, "w", encoding="utf-8") as f:
-            json.dump(cal, f, indent=2, ensure_ascii=False)
-        st.cache_data.clear()
+        _write_json(CALENDAR_FILE, cal)
+        _store_json(CALENDAR_FILE, cal, index)
     except Exception as e:
+        _invalidate_json(CALENDAR_FILE)  # cached copy may hold the unsaved edit
         raise RuntimeError(f"Failed to save calendar: {e}")
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Utility: time helpers
 # ─────────────────────────────────────────────────────────────────────────────
 WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+# 3-letter lowercase prefix -> weekday index ("wed", "weds", "wednesday" all map via name[:3])
+WEEKDAY_INDEX = {n.lower(): i for i, n in enumerate(WEEKDAY_NAMES)}
+_TODAY_WORDS = frozenset({"today", "todays", "to day"})
+_TOMORROW_WORDS = frozenset({"tomorrow", "tmrw", "tmr"})
 
 # Dayparts to allow phrases like "tomorrow afternoon"
 DAYPARTS = {
@@ -287,28 +419,36 @@ DAYPARTS = {
     "night": ("21:00", "23:59")
 }
 
+# Whole words only, so e.g. "morningside" is not read as a daypart
+_DAYPART_RE = re.compile(r"\b(" + "|".join(DAYPARTS) + r")\b")
+
 def extract_daypart(s: str) -> Tuple[str, Optional[Tuple[str,str]]]:
     s = (s or "").strip().lower()
-    for k, rng in DAYPARTS.items():
-        if k in s:
-            clean = s.replace(k, "").strip()
-            return clean, rng
+    m = _DAYPART_RE.search(s)
+    if m:
+        return _DAYPART_RE.sub("", s).strip(), DAYPARTS[m.group(1)]
     return s, None
 
 def _salon_tz() -> ZoneInfo:
+    """Resolved once per session; `_forget_derived` drops it if business/working files change."""
+    cached = st.session_state.get("_salon_tz")
+    if cached is not None:
+        return cached
     biz = load_business_info(BUSINESS_FILE)
     wh = load_working(WORKING_FILE)
     tz = (wh.get("timezone") or biz.get("Timezone") or "America/New_York")
     try:
-        return ZoneInfo(tz)
+        zone = ZoneInfo(tz)
     except Exception:
-        return ZoneInfo("America/New_York")
+        zone = ZoneInfo("America/New_York")
+    st.session_state["_salon_tz"] = zone
+    return zone
 
 def now_in_salon_tz() -> datetime:
     return datetime.now(_salon_tz())
 
-def parse_natural_date(phrase: str, anchor: datetime) -> Optional[datetime]:
-    s = (phrase or "").strip().lower()
+@lru_cache(maxsize=512)
+def _parse_natural_date_cached(s: str, anchor: date) -> Optional[date]:
     if not s:
         return None
 
@@ -316,7 +456,7 @@ def parse_natural_date(phrase: str, anchor: datetime) -> Optional[datetime]:
     try:
         if len(s) == 10 and s[4] == "-" and s[7] == "-":
             y, m, d = s.split("-")
-            return anchor.replace(year=int(y), month=int(m), day=int(d), hour=0, minute=0, second=0, microsecond=0)
+            return date(int(y), int(m), int(d))
     except Exception:
         pass
 
@@ -324,37 +464,37 @@ def parse_natural_date(phrase: str, anchor: datetime) -> Optional[datetime]:
     try:
         if "/" in s:
             m, d = s.split("/")
-            year = anchor.year
-            return anchor.replace(year=year, month=int(m), day=int(d), hour=0, minute=0, second=0, microsecond=0)
+            return date(anchor.year, int(m), int(d))
     except Exception:
         pass
 
-    if s in ("today", "todays", "to day"):
-        return anchor.replace(hour=0, minute=0, second=0, microsecond=0)
-    if s in ("tomorrow", "tmrw", "tmr"):
-        return (anchor + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-
-    def _weekday_index(name: str) -> Optional[int]:
-        name = name[:3].capitalize()
-        if name in WEEKDAY_NAMES:
-            return WEEKDAY_NAMES.index(name)
-        return None
+    if s in _TODAY_WORDS:
+        return anchor
+    if s in _TOMORROW_WORDS:
+        return anchor + timedelta(days=1)
 
     toks = s.split()
     if len(toks) == 1:
-        day_idx = _weekday_index(toks[0])
+        day_idx = WEEKDAY_INDEX.get(toks[0][:3])
         if day_idx is not None:
             delta = (day_idx - anchor.weekday()) % 7
-            return (anchor + timedelta(days=delta)).replace(hour=0, minute=0, second=0, microsecond=0)
+            return anchor + timedelta(days=delta)
 
     if len(toks) == 2 and toks[0] == "next":
-        day_idx = _weekday_index(toks[1])
+        day_idx = WEEKDAY_INDEX.get(toks[1][:3])
         if day_idx is not None:
             delta = ((day_idx - anchor.weekday()) % 7) or 7
-            return (anchor + timedelta(days=delta)).replace(hour=0, minute=0, second=0, microsecond=0)
+            return anchor + timedelta(days=delta)
 
     return None
 
+def parse_natural_date(phrase: str, anchor: datetime) -> Optional[datetime]:
+    """Resolve a date phrase relative to `anchor`; returns local midnight of that day."""
+    d = _parse_natural_date_cached((phrase or "").strip().lower(), anchor.date())
+    if d is None:
+        return None
+    return datetime(d.year, d.month, d.day, tzinfo=anchor.tzinfo)
+
 def _time_to_minutes(hhmm: str) -> int:
     h, m = hhmm.split(":")
     return int(h)*60 + int(m)
@@ -364,54 +504,43 @@ def _minutes_to_time(m: int) -> str:
     mm = m % 60
     return f"{h:02d}:{mm:02d}"
 
-def _expand_ranges_to_slots(ranges: List[str], slot_interval: int, service_min: int) -> List[str]:
-    slots: List[str] = []
+@lru_cache(maxsize=64)
+def _expand_ranges_to_slots(ranges: Tuple[str, ...], slot_interval: int, service_min: int) -> Tuple[int, ...]:
+    """Slot start times (minutes since midnight) that fit `service_min` inside the ranges."""
+    slots: List[int] = []
     for r in ranges:
         try:
             start_s, end_s = r.split("-")
             start = _time_to_minutes(start_s)
             end = _time_to_minutes(end_s)
-            t = start
-            while t + service_min <= end:
-                slots.append(_minutes_to_time(t))
-                t += slot_interval
+            slots.extend(range(start, end - service_min + 1, slot_interval))
         except Exception:
             continue
-    return slots
-
-def _subtract_appointments(slots: List[str], taken_ranges: List[str], service_min: int) -> List[str]:
-    keep: List[str] = []
-    for s in slots:
-        start = _time_to_minutes(s)
-        end = start + service_min
-        conflict = False
-        for r in taken_ranges or []:
-            try:
-                rs, re = r.split("-")
-                rs_m = _time_to_minutes(rs)
-                re_m = _time_to_minutes(re)
-                if start < re_m and end > rs_m:
-                    conflict = True
-                    break
-            except Exception:
-                continue
-        if not conflict:
-            keep.append(s)
-    return keep
+    return tuple(slots)
+
+def _overlaps(starts: List[int], reach: List[int], start: int, end: int) -> bool:
+    """True if [start, end) overlaps a taken span (lists from `_index_calendar`)."""
+    i = bisect.bisect_right(reach, start)
+    return i < len(starts) and starts[i] < end
+
+def _subtract_appointments(slots: Tuple[int, ...], starts: List[int], reach: List[int],
+                           service_min: int) -> List[int]:
+    if not starts:
+        return list(slots)
+    return [s for s in slots if not _overlaps(starts, reach, s, s + service_min)]
 
 def _get_service_minutes(name: Optional[str]) -> int:
-    data = load_services(SERVICES_FILE)
-    services = data.get("services", [])
     if name:
-        for s in services:
-            if str(s.get("name","")).lower() == name.strip().lower():
-                dur = s.get("duration", 30)
-                try:
-                    return int(dur)
-                except Exception:
-                    pass
+        load_services(SERVICES_FILE)
+        entry = (_json_index(SERVICES_FILE) or {}).get(name.strip().lower())
+        if entry:
+            try:
+                return int(entry.get("duration", 30))
+            except Exception:
+                pass
     return 30
 
+@lru_cache(maxsize=512)
 def _normalize_time_to_hhmm(s: str) -> Optional[str]:
     """
     Accept common inputs: '9', '09', '9:00', '9.00', '9 00', '9am', '1:30 pm', '13', '13:45'.
@@ -538,14 +667,19 @@ def _append_booking_record(date_str: str, start_hhmm: str, end_hhmm: str,
         "created_at": now_in_salon_tz().isoformat()
     }
     data.setdefault("bookings", []).append(rec)
-    with open(BOOKINGS_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    st.cache_data.clear()
+    if _is_jsonl(BOOKINGS_FILE):
+        # Append one line instead of rewriting the whole history
+        with open(BOOKINGS_FILE, "a", encoding="utf-8") as f:
+            f.write(_dumps(rec) + "\n")
+        _store_json(BOOKINGS_FILE, data["bookings"])
+    else:
+        _write_json(BOOKINGS_FILE, data)
+        _store_json(BOOKINGS_FILE, data)
 
-def _get_taken_ranges_from_calendar(date_str: str) -> List[str]:
-    cal = load_calendar(CALENDAR_FILE)
-    appts = cal.get("appointments", {})
-    return appts.get(date_str, []) or []
+def _get_taken_spans(date_str: str) -> Tuple[List[int], List[int]]:
+    load_calendar(CALENDAR_FILE)  # populates the session cache + index
+    index = _json_index(CALENDAR_FILE) or {}
+    return index.get(date_str, ([], []))
 
 def _append_appointment(date_str: str, start_hhmm: str, duration_min: int,
                         client_name: str, phone: str, email: str) -> Tuple[bool, str]:
@@ -561,36 +695,32 @@ def _append_appointment(date_str: str, start_hhmm: str, duration_min: int,
     end_hhmm = _minutes_to_time(end_minutes)
 
     # Collision check
-    taken = _get_taken_ranges_from_calendar(date_str)
-    start_m = _time_to_minutes(start_hhmm)
-    end_m = end_minutes
-    for r in taken:
-        try:
-            rs, re = r.split("-")
-            rs_m = _time_to_minutes(rs)
-            re_m = _time_to_minutes(re)
-            if start_m < re_m and end_m > rs_m:
-                return False, "That time was just taken. Please pick another slot."
-        except Exception:
-            continue
+    starts, reach = _get_taken_spans(date_str)
+    if _overlaps(starts, reach, _time_to_minutes(start_hhmm), end_minutes):
+        return False, "That time was just taken. Please pick another slot."
 
-    # Append
+    # Insert in start order; the day's list and the cached index are already sorted
     cal = load_calendar(CALENDAR_FILE)
-    cal.setdefault("appointments", {})
-    cal["appointments"].setdefault(date_str, [])
+    index = _json_index(CALENDAR_FILE)
+    if index is None:
+        index = _index_calendar(cal)
+    day = cal.setdefault("appointments", {}).setdefault(date_str, [])
+    starts, reach = index.setdefault(date_str, ([], []))
+    start_m = _time_to_minutes(start_hhmm)
     new_range = f"{start_hhmm}-{end_hhmm}"
-    if new_range not in cal["appointments"][date_str]:
-        cal["appointments"][date_str].append(new_range)
 
-    # Sort by start
-    def _sort_key(rr: str) -> int:
-        try:
-            ss, _ee = rr.split("-")
-            return _time_to_minutes(ss)
-        except Exception:
-            return 0
-    cal["appointments"][date_str] = sorted(list(set(cal["appointments"][date_str])), key=_sort_key)
-    _save_calendar(cal)
+    i = bisect.bisect_left(starts, start_m)
+    pos = len(day) - len(starts) + i  # unparseable entries sit ahead of the valid ones
+    if pos < len(day) and day[pos] == new_range:
+        return True, f"Booked {date_str} {start_hhmm}-{end_hhmm}."
+    day.insert(pos, new_range)
+    starts.insert(i, start_m)
+    reach.insert(i, max(reach[i - 1] if i else -1, end_minutes))
+    for j in range(i + 1, len(reach)):
+        if reach[j] >= reach[i]:
+            break
+        reach[j] = reach[i]
+    _save_calendar(cal, index)
 
     return True, f"Booked {date_str} {start_hhmm}-{end_hhmm}."
 
@@ -667,13 +797,13 @@ def get_services(names: Optional[List[str]] = None) -> Dict[str, Any]:
     data = load_services(SERVICES_FILE)
     services = data.get("services", [])
     if names:
-        name_set = {n.strip().lower() for n in names if isinstance(n, str)}
-        filtered = [s for s in services if str(s.get("name", "")).lower() in name_set]
-        missing = [n for n in names if n.strip().lower() not in {str(s.get("name","")).lower() for s in services}]
+        by_name = _json_index(SERVICES_FILE) or {}
+        wanted = dict.fromkeys(n.strip().lower() for n in names if isinstance(n, str))
+        filtered = [by_name[k] for k in wanted if k in by_name]
+        missing = [n for n in names if isinstance(n, str) and n.strip().lower() not in by_name]
         return {"services": filtered, "missing": missing}
     return {"services": services, "missing": []}
 
-@traceable(name="tool:get_now")
 def get_now() -> Dict[str, Any]:
     now = now_in_salon_tz()
     return {
@@ -715,35 +845,114 @@ def check_availability(date_phrase: Optional[str] = None,
         return {"date": date_str, "weekday": weekday, "available": [], "closed": True}
 
     service_min = _get_service_minutes(service_name)
-    all_slots = _expand_ranges_to_slots(ranges, slot_interval, service_min)
+    all_slots = _expand_ranges_to_slots(tuple(map(str, ranges)), slot_interval, service_min)
 
     # Apply calendar conflicts
-    taken_ranges = _get_taken_ranges_from_calendar(date_str)
-    free_slots = _subtract_appointments(all_slots, taken_ranges, service_min)
+    starts, reach = _get_taken_spans(date_str)
+    free_m = _subtract_appointments(all_slots, starts, reach, service_min)
 
     # daypart filter (use start >= start_m and start < end_m - duration)
     if daypart:
         start_m = _time_to_minutes(daypart[0])
         end_m = _time_to_minutes(daypart[1])
-        free_slots = [
-            s for s in free_slots
-            if _time_to_minutes(s) >= start_m
-            and _time_to_minutes(s) + service_min <= end_m
-        ]
+        free_m = [m for m in free_m if m >= start_m and m + service_min <= end_m]
 
     # today filter (slot end must be in the future)
     now_local = now_in_salon_tz()
     if date_str == now_local.strftime("%Y-%m-%d"):
-        now_m = _time_to_minutes(now_local.strftime("%H:%M"))
-        free_slots = [s for s in free_slots if _time_to_minutes(s) + service_min > now_m]
+        now_m = now_local.hour * 60 + now_local.minute
+        free_m = [m for m in free_m if m + service_min > now_m]
 
     return {
         "date": date_str,
         "weekday": weekday,
         "service": service_name,
         "duration_minutes": service_min,
-        "available": free_slots[:max(1, int(limit))],
-        "total_available": len(free_slots),
+        "available": [_minutes_to_time(m) for m in free_m[:max(1, int(limit))]],
+        "total_available": len(free_m),
+    }
+
+@traceable(name="tool:check_availability_range")
+def check_availability_range(start_phrase: Optional[str] = None,
+                             days: int = 7,
+                             service_name: Optional[str] = None,
+                             limit_per_day: int = 8) -> Dict[str, Any]:
+    """
+    Availability for `days` consecutive dates in one pass. Every day's slot grid is
+    padded into a (days x slots) matrix and checked against a (days x taken) matrix
+    of calendar spans with broadcasting, instead of running check_availability per day.
+    """
+    working = load_working(WORKING_FILE)
+    cleaned_phrase, daypart = extract_daypart(start_phrase or "")
+
+    anchor = now_in_salon_tz()
+    start_dt = parse_natural_date(cleaned_phrase or "today", anchor)
+    if not start_dt:
+        return {"error": "Could not parse date.", "days": [], "start_date": None}
+
+    days = max(1, min(int(days), 31))
+    weekly_hours: Dict[str, List[str]] = working.get("weekly_hours", {})
+    exceptions: Dict[str, List[str]] = working.get("exceptions", {})
+    slot_interval = int(working.get("slot_interval_minutes", 15))
+    service_min = _get_service_minutes(service_name)
+    today_str = anchor.strftime("%Y-%m-%d")
+
+    dates: List[Tuple[str, str]] = []
+    closed: List[bool] = []
+    grids: List[Tuple[int, ...]] = []
+    taken: List[Tuple[List[int], List[int]]] = []
+    for offset in range(days):
+        day = start_dt + timedelta(days=offset)
+        date_str = day.strftime("%Y-%m-%d")
+        weekday = WEEKDAY_NAMES[day.weekday()]
+        ranges = exceptions[date_str] if date_str in exceptions else weekly_hours.get(weekday, [])
+        dates.append((date_str, weekday))
+        closed.append(not ranges)  # same rule as check_availability: no hours at all
+        grids.append(_expand_ranges_to_slots(tuple(map(str, ranges or [])), slot_interval, service_min))
+        taken.append(_get_taken_spans(date_str))
+
+    # Pad ragged per-day lists; padded taken spans can never conflict (start past
+    # midnight, reach before it), padded slots are masked out via `valid`.
+    n_slots = max(1, max(len(g) for g in grids))
+    n_taken = max(1, max(len(t[0]) for t in taken))
+    starts = np.zeros((days, n_slots), dtype=np.int32)
+    valid = np.zeros((days, n_slots), dtype=bool)
+    t_start = np.full((days, n_taken), 10_000, dtype=np.int32)
+    t_reach = np.full((days, n_taken), -1, dtype=np.int32)
+    cutoff = np.full(days, -1, dtype=np.int32)  # slot end must be > cutoff
+    for i, (grid, (ts, tr)) in enumerate(zip(grids, taken)):
+        starts[i, :len(grid)] = grid
+        valid[i, :len(grid)] = True
+        t_start[i, :len(ts)] = ts
+        t_reach[i, :len(tr)] = tr
+        if dates[i][0] == today_str:
+            cutoff[i] = anchor.hour * 60 + anchor.minute
+
+    ends = starts + service_min
+    conflict = ((t_start[:, None, :] < ends[:, :, None]) & (t_reach[:, None, :] > starts[:, :, None])).any(axis=2)
+    free = valid & ~conflict & (ends > cutoff[:, None])
+    if daypart:
+        free &= (starts >= _time_to_minutes(daypart[0])) & (ends <= _time_to_minutes(daypart[1]))
+
+    out: List[Dict[str, Any]] = []
+    per_day = max(1, int(limit_per_day))
+    for i, (date_str, weekday) in enumerate(dates):
+        if closed[i]:
+            out.append({"date": date_str, "weekday": weekday, "available": [], "closed": True})
+            continue
+        free_m = starts[i][free[i]]
+        out.append({
+            "date": date_str,
+            "weekday": weekday,
+            "available": [_minutes_to_time(int(m)) for m in free_m[:per_day]],
+            "total_available": int(free_m.size),
+        })
+
+    return {
+        "start_date": dates[0][0],
+        "service": service_name,
+        "duration_minutes": service_min,
+        "days": out,
     }
 
 @traceable(name="tool:book_appointment")
@@ -813,6 +1022,9 @@ def book_appointment(date_str: str,
         "client_name": client_name
     }
 
+# Slots that must be filled before a booking can be confirmed
+REQUIRED_SLOTS = ("service", "date", "time", "name", "phone", "email")
+
 # Conversation state stored in session (not visible to user)
 def _ensure_dialogue_container():
     if "dialogue" not in st.session_state:
@@ -826,12 +1038,21 @@ def _ensure_dialogue_container():
             "confirmed": False
         }
 
-@traceable(name="tool:get_conversation_state")
+def _pick_model() -> str:
+    """
+    Route slot-filling turns to MODEL_SMALL; use MODEL once every slot is filled
+    (confirmation + booking) or the booking was confirmed.
+    """
+    _ensure_dialogue_container()
+    d = st.session_state.dialogue
+    if d.get("confirmed") or all(d.get(k) for k in REQUIRED_SLOTS):
+        return MODEL
+    return MODEL_SMALL
+
 def get_conversation_state() -> Dict[str, Any]:
     _ensure_dialogue_container()
-    return {"state": st.session_state.dialogue}
+    return {"state": dict(st.session_state.dialogue)}  # snapshot: later calls may update it
 
-@traceable(name="tool:update_conversation_state")
 def update_conversation_state(**kwargs) -> Dict[str, Any]:
     _ensure_dialogue_container()
     allowed = {"service", "date", "time", "name", "phone", "email", "confirmed"}
@@ -847,7 +1068,7 @@ def update_conversation_state(**kwargs) -> Dict[str, Any]:
     for k, v in kwargs.items():
         if k in allowed:
             st.session_state.dialogue[k] = v
-    return {"state": st.session_state.dialogue}
+    return {"state": dict(st.session_state.dialogue)}
 
 @traceable(name="tool:normalize_and_store_date")
 def normalize_and_store_date(date_phrase: str):
@@ -865,167 +1086,196 @@ def normalize_and_store_date(date_phrase: str):
         return {"ok": True, "date": cleaned, "normalized": False}
 
 # ── Tool list (includes internal planning + conv-state tools) ────────────────
-TOOLS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "internal_plan",
-            "description": "Hidden planning tool. Use FIRST each turn to outline objective, steps, missing info, and tools. Do NOT expose to the user.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "objective": {"type": "string"},
-                    "steps": {"type": "array", "items": {"type": "string"}},
-                    "missing_info": {"type": "array", "items": {"type": "string"}},
-                    "tools_to_use": {"type": "array", "items": {"type": "string"}},
-                    "state_updates": {"type": "object"}
-                },
-                "required": ["objective"]
+# Built once per server process (not on every Streamlit rerun) and shared by all sessions.
+@st.cache_resource(show_spinner=False)
+def _tool_schemas() -> List[Dict[str, Any]]:
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "internal_plan",
+                "description": "Hidden planning tool. Call it alongside the turn's first other tool calls (same message) to outline objective, steps, missing info, and tools. Returns only an acknowledgement. Do NOT expose to the user.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "objective": {"type": "string"},
+                        "steps": {"type": "array", "items": {"type": "string"}},
+                        "missing_info": {"type": "array", "items": {"type": "string"}},
+                        "tools_to_use": {"type": "array", "items": {"type": "string"}},
+                        "state_updates": {"type": "object"}
+                    },
+                    "required": ["objective"]
+                }
             }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_business_info",
-            "description": "Read specific fields from business_info.json and return values.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "keys": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "Fields to fetch, e.g., ['Business Name','Address','Phone','Policies','Announcements','Timezone','Email']"
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_business_info",
+                "description": "Read specific fields from business_info.json and return values.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "keys": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Fields to fetch, e.g., ['Business Name','Address','Phone','Policies','Announcements','Timezone','Email']"
+                        }
+                    },
+                    "required": ["keys"]
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_services",
+                "description": "Return services (optionally filtered by name) with name, duration, price, and description from services.json.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "names": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Optional list of service names to filter; exact (case-insensitive) name match."
+                        }
                     }
-                },
-                "required": ["keys"]
+                }
             }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_services",
-            "description": "Return services (optionally filtered by name) with name, duration, price, and description from services.json.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "names": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "Optional list of service names to filter; exact (case-insensitive) name match."
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_now",
+                "description": "Return the current date/time in the salon timezone as ISO string and friendly parts.",
+                "parameters": {"type": "object", "properties": {}}
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_hours",
+                "description": "Return opening/closing hours for a given date, respecting weekly_hours and exceptions.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "date_phrase": {"type": "string", "description": "Natural date phrase or explicit date (e.g., 'tomorrow', '2025-10-18')."}
                     }
                 }
             }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_now",
-            "description": "Return the current date/time in the salon timezone as ISO string and friendly parts.",
-            "parameters": {"type": "object", "properties": {}}
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_hours",
-            "description": "Return opening/closing hours for a given date, respecting weekly_hours and exceptions.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "date_phrase": {"type": "string", "description": "Natural date phrase or explicit date (e.g., 'tomorrow', '2025-10-18')."}
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "check_availability",
+                "description": "Compute available start times for a given date phrase considering weekly_hours, exceptions, and the calendar of existing appointments.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "date_phrase": {"type": "string", "description": "Natural date phrase or explicit date."},
+                        "service_name": {"type": "string", "description": "Optional service name to determine duration."},
+                        "limit": {"type": "integer", "description": "Max number of slots to return (default 8)."}
+                    }
                 }
             }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "check_availability",
-            "description": "Compute available start times for a given date phrase considering weekly_hours, exceptions, and the calendar of existing appointments.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "date_phrase": {"type": "string", "description": "Natural date phrase or explicit date."},
-                    "service_name": {"type": "string", "description": "Optional service name to determine duration."},
-                    "limit": {"type": "integer", "description": "Max number of slots to return (default 8)."}
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "check_availability_range",
+                "description": "Compute available start times for several consecutive days at once (e.g., 'this week'), considering weekly_hours, exceptions, and existing appointments.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "start_phrase": {"type": "string", "description": "First date as a natural phrase or explicit date (default 'today'); may include a daypart like 'afternoon'."},
+                        "days": {"type": "integer", "description": "Number of consecutive days to check (default 7, max 31)."},
+                        "service_name": {"type": "string", "description": "Optional service name to determine duration."},
+                        "limit_per_day": {"type": "integer", "description": "Max number of slots to return per day (default 8)."}
+                    }
                 }
             }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "book_appointment",
-            "description": "Book an appointment by re-checking availability and then saving the time range to calendar.json.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "date_str": {"type": "string", "description": "Booking date in 'YYYY-MM-DD' (or natural phrase previously resolved)."},
-                    "start_time": {"type": "string", "description": "Start time in HH:MM (24h)."},
-                    "service_name": {"type": "string", "description": "Service name to determine duration."},
-                    "client_name": {"type": "string"},
-                    "phone": {"type": "string"},
-                    "email": {"type": "string"}
-                },
-                "required": ["date_str", "start_time", "client_name", "phone", "email"]
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "book_appointment",
+                "description": "Book an appointment by re-checking availability and then saving the time range to calendar.json.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "date_str": {"type": "string", "description": "Booking date in 'YYYY-MM-DD' (or natural phrase previously resolved)."},
+                        "start_time": {"type": "string", "description": "Start time in HH:MM (24h)."},
+                        "service_name": {"type": "string", "description": "Service name to determine duration."},
+                        "client_name": {"type": "string"},
+                        "phone": {"type": "string"},
+                        "email": {"type": "string"}
+                    },
+                    "required": ["date_str", "start_time", "client_name", "phone", "email"]
+                }
             }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_conversation_state",
-            "description": "Return the current conversation slot state (service, date, time, name, phone, email, confirmed).",
-            "parameters": {"type": "object", "properties": {}}
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "normalize_and_store_date",
-            "description": "Normalize a natural date phrase (e.g., 'tomorrow afternoon') and store YYYY-MM-DD into conversation state.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "date_phrase": {"type": "string"}
-                },
-                "required": ["date_phrase"]
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_conversation_state",
+                "description": "Return the current conversation slot state (service, date, time, name, phone, email, confirmed).",
+                "parameters": {"type": "object", "properties": {}}
             }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "update_conversation_state",
-            "description": "Update conversation slot state with any provided keys (service, date, time, name, phone, email, confirmed).",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "service": {"type": "string"},
-                    "date": {"type": "string"},
-                    "time": {"type": "string"},
-                    "name": {"type": "string"},
-                    "phone": {"type": "string"},
-                    "email": {"type": "string"},
-                    "confirmed": {"type": "boolean"}
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "normalize_and_store_date",
+                "description": "Normalize a natural date phrase (e.g., 'tomorrow afternoon') and store YYYY-MM-DD into conversation state.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "date_phrase": {"type": "string"}
+                    },
+                    "required": ["date_phrase"]
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "update_conversation_state",
+                "description": "Update conversation slot state with any provided keys (service, date, time, name, phone, email, confirmed).",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "service": {"type": "string"},
+                        "date": {"type": "string"},
+                        "time": {"type": "string"},
+                        "name": {"type": "string"},
+                        "phone": {"type": "string"},
+                        "email": {"type": "string"},
+                        "confirmed": {"type": "boolean"}
+                    }
                 }
             }
         }
-    }
-]
+    ]
+
+TOOLS = _tool_schemas()
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Admin Dashboard (Owner)
 # ─────────────────────────────────────────────────────────────────────────────
+@st.cache_data(show_spinner=False, max_entries=32)
+def _pretty(path: str, mtime: float) -> str:
+    """Indented text of a JSON file as written by _write_json; `mtime` keys the cache."""
+    return _dumps_indented(_load_json(path)).decode()
+
 def _json_editor(title: str, path: str, loader_fn, height: int = 420, key_prefix: str = ""):
     kp = key_prefix or os.path.basename(path).replace(".", "_")
 
     st.caption(f"Editing file: `{path}`")
-    current = loader_fn(path)
-    pretty = json.dumps(current or {}, indent=2, ensure_ascii=False)
+    current = loader_fn(path)  # also seeds the file if missing
+    try:
+        pretty = _pretty(path, os.path.getmtime(path))
+    except Exception:  # unreadable file: show the loader's fallback
+        pretty = _dumps_indented(current or {}).decode()
 
     st.markdown(f"**{title}**")
     edited = st.text_area(
@@ -1041,7 +1291,7 @@ def _json_editor(title: str, path: str, loader_fn, height: int = 420, key_prefix
     with c1:
         if st.button("Validate JSON", use_container_width=True, key=f"{kp}_validate"):
             try:
-                json.loads(edited)
+                _loads(edited)
                 st.success("JSON is valid ✅")
             except Exception as e:
                 st.error(f"Invalid JSON: {e}")
@@ -1049,30 +1299,36 @@ def _json_editor(title: str, path: str, loader_fn, height: int = 420, key_prefix
     with c2:
         if st.button("Save", type="primary", use_container_width=True, key=f"{kp}_save"):
             try:
-                parsed = json.loads(edited)
-                with open(path, "w", encoding="utf-8") as f:
-                    json.dump(parsed, f, indent=2, ensure_ascii=False)
-                st.cache_data.clear()
+                parsed = _loads(edited)
+                _write_json(path, parsed)
+                _store_json(path, parsed)
+                pretty = _pretty(path, os.path.getmtime(path))
                 st.success("Saved changes.")
             except Exception as e:
                 st.error(f"Save failed: {e}")
 
     with c3:
         if st.button("Reload", use_container_width=True, key=f"{kp}_reload"):
-            st.cache_data.clear()
+            # Only this file: drop its parsed copy and the textarea's edited text
+            _invalidate_json(path)
+            st.session_state.pop(f"{kp}_textarea", None)
             st.rerun()
 
     with c4:
-        dl = json.dumps(loader_fn(path), indent=2, ensure_ascii=False)
         st.download_button(
             label="Download current JSON",
             file_name=os.path.basename(path),
             mime="application/json",
-            data=dl.encode("utf-8"),
+            data=pretty.encode("utf-8"),
             use_container_width=True,
             key=f"{kp}_download",
         )
 
+@st.cache_data(show_spinner=False, max_entries=2)
+def _bookings_download(path: str, mtime: float) -> bytes:
+    """Encoded bookings export; `mtime` is only the cache key, so this reruns only when the file changes."""
+    return _dumps_indented({"bookings": load_bookings(path).get("bookings", [])})
+
 def admin_panel():
     st.subheader("Admin Settings")
     if "admin_authed" not in st.session_state:
@@ -1148,7 +1404,7 @@ def admin_panel():
             "  }\n"
             "}\n"
             "```\n"
-            "_Client details live in bookings.json for privacy._"
+            "_Client details live in bookings.jsonl for privacy._"
         )
         _json_editor("calendar.json", CALENDAR_FILE, load_calendar, key_prefix="calendar_file")
 
@@ -1158,7 +1414,7 @@ def admin_panel():
         st.dataframe(bookings, use_container_width=True, hide_index=True)
         st.download_button(
             "Download bookings.json",
-            data=json.dumps({"bookings": bookings}, indent=2, ensure_ascii=False).encode("utf-8"),
+            data=_bookings_download(BOOKINGS_FILE, os.path.getmtime(BOOKINGS_FILE)),
             file_name="bookings.json",
             mime="application/json",
             use_container_width=True,
@@ -1168,171 +1424,394 @@ def admin_panel():
     st.divider()
     st.caption("Tip: Set ADMIN_USERNAME / ADMIN_PASSWORD via environment variables or Streamlit secrets.")
     # LangSmith status hint
-    if HAS_LANGSMITH and os.getenv("LANGCHAIN_TRACING_V2") == "true":
+    if HAS_LANGSMITH:
         st.caption(f"🧭 LangSmith tracing: ON (project: {os.getenv('LANGCHAIN_PROJECT','default')})")
-    elif not HAS_LANGSMITH:
+    elif TRACING_ON:
         st.caption("🧭 LangSmith tracing: package not installed (pip install langsmith)")
 
 # ─────────────────────────────────────────────────────────────────────────────
 # LLM wrapper (traced)
 # ─────────────────────────────────────────────────────────────────────────────
+# Re-render the streaming placeholder every N content chunks (not every token)
+STREAM_RENDER_EVERY = 4
+
 @traceable(name="openai.chat.completions.create")
-def _llm_call(model: str, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]], temperature: float = 0.6):
-    return client.chat.completions.create(
+async def _llm_call(model: str, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]], temperature: float = 0.6):
+    return await _session_client().chat.completions.create(
         model=model,
         messages=messages,
         tools=tools,
         tool_choice="auto",
         temperature=temperature,
+        stream=True,
+        stream_options={"include_usage": True},
     )
 
-# (Optional) wrap a user turn
-@traceable(name="ui:handle_user_turn")
-def _handle_user_turn_run(messages_payload: List[Dict[str, Any]]):
-    return _llm_call(model=MODEL, messages=messages_payload, tools=TOOLS, temperature=0.6)
-
-# ─────────────────────────────────────────────────────────────────────────────
-# UI: Chat (with conversation loop + internal planning)
-# ─────────────────────────────────────────────────────────────────────────────
-st.title("💇‍♀️ Sunny — Salon Receptionist")
-
-with st.sidebar:
-    st.markdown("### Owner/Admin")
-    admin_panel()
-
-# Keep message history bounded to avoid token bloat
-MAX_HISTORY = 30
-
-if "messages" not in st.session_state:
-    st.session_state.messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "assistant", "content": "Hi there! I’m Sunny, your friendly salon receptionist. How can I help today?"}
+async def _collect_stream(stream, placeholder=None) -> SimpleNamespace:
+    """
+    Drain a streamed completion into a message-like object (.content, .tool_calls),
+    rendering text into `placeholder` as it arrives. Tool-call deltas arrive in
+    pieces and are stitched together by their `index`.
+    """
+    parts: List[str] = []
+    calls: Dict[int, Dict[str, str]] = {}
+    async for chunk in stream:
+        if not chunk.choices:  # trailing usage-only chunk
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            parts.append(delta.content)
+            if placeholder is not None and len(parts) % STREAM_RENDER_EVERY == 0:
+                placeholder.markdown("".join(parts) + "▌")
+        for tc in delta.tool_calls or []:
+            slot = calls.setdefault(tc.index, {"id": "", "name": "", "arguments": ""})
+            if tc.id:
+                slot["id"] = tc.id
+            if tc.function:
+                slot["name"] += tc.function.name or ""
+                slot["arguments"] += tc.function.arguments or ""
+
+    content = "".join(parts)
+    if placeholder is not None and content:
+        placeholder.markdown(content)
+    tool_calls = [
+        SimpleNamespace(
+            id=c["id"],
+            type="function",
+            function=SimpleNamespace(name=c["name"], arguments=c["arguments"]),
+        )
+        for _, c in sorted(calls.items())
     ]
+    return SimpleNamespace(content=content or None, tool_calls=tool_calls or None)
 
-# Render chat history (except the system message)
-for i, m in enumerate(st.session_state.messages):
-    if m["role"] == "system":
-        continue
-    with st.chat_message(m["role"]):
-        st.markdown(m["content"])
+HISTORY_SUMMARY_PROMPT = """
+Summarize this earlier part of a salon receptionist chat in under 150 words.
+Keep facts needed to continue: requested service, dates/times discussed or booked,
+client name/phone/email if given, and any open question. Plain text, no preamble.
+""".strip()
 
-user_text = st.chat_input("Type your message")
-if user_text:
-    st.session_state.messages.append({"role": "user", "content": user_text})
-    if len(st.session_state.messages) > MAX_HISTORY:
-        st.session_state.messages = [st.session_state.messages[0]] + st.session_state.messages[-(MAX_HISTORY-1):]
+@traceable(name="openai.summarize_history")
+def _summarize_messages(client: OpenAI, msgs: List[Dict[str, Any]]) -> str:
+    """Runs on a worker thread (see _start_compaction), hence the sync client."""
+    lines = []
+    for m in msgs:
+        body = m.get("content") or _dumps(m.get("tool_calls"))
+        lines.append(f"{m['role']}: {body}")
+    resp = client.chat.completions.create(
+        model=MODEL_SMALL,
+        messages=[
+            {"role": "system", "content": HISTORY_SUMMARY_PROMPT},
+            {"role": "user", "content": "\n".join(lines)},
+        ],
+        temperature=0,
+    )
+    return (resp.choices[0].message.content or "").strip()
 
-    with st.chat_message("user"):
-        st.markdown(user_text)
+# (Optional) wrap a user turn
+@traceable(name="ui:handle_user_turn")
+async def _handle_user_turn_run(messages_payload: List[Dict[str, Any]], placeholder=None):
+    return await _collect_stream(
+        await _llm_call(model=_pick_model(), messages=messages_payload, tools=TOOLS, temperature=0.6),
+        placeholder,
+    )
 
-    controller_hint = {"role": "system", "content": REASONING_CONTROLLER}
+# ─────────────────────────────────────────────────────────────────────────────
+# Tool dispatch
+# ─────────────────────────────────────────────────────────────────────────────
+# Zero-cost local tools: no LangSmith span (they only inflate the trace tree)
+UNTRACED_TOOLS = frozenset({"internal_plan", "get_now", "get_conversation_state", "update_conversation_state"})
+
+# name -> handler(args); args is the parsed JSON arguments object
+TOOL_TABLE: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "internal_plan": lambda a: {"ok": True},  # scratchpad only; the model already has its plan
+    "get_business_info": lambda a: get_business_info(a.get("keys", [])),
+    "get_services": lambda a: get_services(a.get("names")),
+    "get_now": lambda a: get_now(),
+    "get_hours": lambda a: get_hours(a.get("date_phrase")),
+    "check_availability": lambda a: check_availability(
+        date_phrase=a.get("date_phrase"),
+        service_name=a.get("service_name"),
+        limit=int(a.get("limit", 8)),
+    ),
+    "check_availability_range": lambda a: check_availability_range(
+        start_phrase=a.get("start_phrase"),
+        days=int(a.get("days", 7)),
+        service_name=a.get("service_name"),
+        limit_per_day=int(a.get("limit_per_day", 8)),
+    ),
+    "book_appointment": lambda a: book_appointment(
+        date_str=a.get("date_str"),
+        start_time=a.get("start_time"),
+        service_name=a.get("service_name"),
+        client_name=a.get("client_name"),
+        phone=a.get("phone"),
+        email=a.get("email"),
+    ),
+    "get_conversation_state": lambda a: get_conversation_state(),
+    "update_conversation_state": lambda a: update_conversation_state(**a),
+    "normalize_and_store_date": lambda a: normalize_and_store_date(a.get("date_phrase", "")),
+}
 
-    try:
-        # First LLM call (traced)
-        response = _handle_user_turn_run([
-            *[
-                {"role": m["role"], "content": m.get("content",""), **({"tool_calls": m.get("tool_calls")} if "tool_calls" in m else {})}
-                for m in st.session_state.messages
-            ],
-            controller_hint,
-        ])
-    except Exception as e:
-        with st.chat_message("assistant"):
-            st.error(f"Model error: {e}")
-        st.stop()
+def _run_tool(name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    fn = TOOL_TABLE.get(name)
+    if fn is None:
+        return {"error": f"Unknown tool {name}"}
+    return fn(args)
+
+execute_tool_call = traceable(name="tool:execute_tool_call")(_run_tool)
+
+# Tools that write session state or files: each runs alone, in call order, so two of
+# them in one message can't race (e.g. a double booking of the same slot) and reads
+# around them see the state the call order implies.
+STATEFUL_TOOLS = frozenset({"book_appointment", "update_conversation_state", "normalize_and_store_date"})
+
+@st.cache_resource(show_spinner=False)
+def _tool_executor() -> ThreadPoolExecutor:
+    """Bounded worker pool for tool calls, shared by all sessions."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="tool")
+
+# Tools that only acknowledge: answered inline, without a worker thread
+ACK_ONLY_TOOLS = frozenset({"internal_plan"})
+# ...and their results pre-encoded for the transcript (constant, so encode once)
+_TINY_ACKS = {name: _dumps(TOOL_TABLE[name]({})) for name in ACK_ONLY_TOOLS}
+
+async def _dispatch(name: str, args: Dict[str, Any], ctx) -> Dict[str, Any]:
+    if name in ACK_ONLY_TOOLS:
+        return TOOL_TABLE[name](args)
+
+    def run():
+        # Worker threads need the script context to reach st.session_state
+        add_script_run_ctx(threading.current_thread(), ctx)
+        if name in UNTRACED_TOOLS:
+            return _run_tool(name, args)
+        return execute_tool_call(name, args)
+    return await asyncio.get_running_loop().run_in_executor(_tool_executor(), run)
+
+async def _dispatch_all(tool_calls) -> List[Dict[str, Any]]:
+    """
+    Run one assistant message's tool calls with the effects of call order: each run
+    of consecutive read-only calls goes concurrently, and a stateful call starts only
+    after everything before it and finishes before anything after it. Results keep
+    call order.
+    """
+    ctx = get_script_run_ctx()
+    # Parse each call's arguments exactly once; the raw strings stay in the transcript
+    calls = [(tc.function.name, _loads(tc.function.arguments or "{}")) for tc in tool_calls]
+    results: List[Any] = [None] * len(calls)
+    batch: List[int] = []  # read-only calls since the last stateful one
+
+    async def flush():
+        done = await asyncio.gather(*(_dispatch(*calls[i], ctx) for i in batch))
+        for i, payload in zip(batch, done):
+            results[i] = payload
+        batch.clear()
+
+    for i, (name, args) in enumerate(calls):
+        if name in STATEFUL_TOOLS:
+            await flush()
+            results[i] = await _dispatch(name, args, ctx)
+        else:
+            batch.append(i)
+    await flush()
+    return results
 
-    message = response.choices[0].message
+# ─────────────────────────────────────────────────────────────────────────────
+# Turn handler (async; driven from the Streamlit script via a per-session loop)
+# ─────────────────────────────────────────────────────────────────────────────
+def _session_loop() -> asyncio.AbstractEventLoop:
+    """One event loop per browser session, reused across reruns."""
+    loop = st.session_state.get("_event_loop")
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        st.session_state["_event_loop"] = loop
+        st.session_state.pop("_openai_client", None)  # its connections belonged to the old loop
+    return loop
+
+@st.cache_resource(show_spinner=False)
+def _background_client() -> OpenAI:
+    """Sync client for calls made off the script thread; thread-safe, so shared by all sessions."""
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+def _session_client() -> AsyncOpenAI:
+    """
+    One AsyncOpenAI client per session, reused across reruns so its HTTP keep-alive
+    pool survives. Not st.cache_resource: async connections are bound to the event
+    loop that opened them, and each session runs its own loop.
+    """
+    c = st.session_state.get("_openai_client")
+    if c is None:
+        c = st.session_state["_openai_client"] = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return c
 
-    # Tool-iteration loop (keep a single execute_tool_call defined here)
-    interim_messages = [
-        *[
-            {"role": m["role"], "content": m.get("content",""), **({"tool_calls": m.get("tool_calls")} if "tool_calls" in m else {})}
-            for m in st.session_state.messages
-        ],
-        controller_hint,
-    ]
+async def run_turn(messages: List[Dict[str, Any]], placeholder=None) -> str:
+    """
+    Run one user turn against the transcript: stream the model, execute any tool
+    calls it requests (appending both to `messages`), and return the reply text.
+    """
+    # First LLM call (traced, streamed)
+    message = await _handle_user_turn_run(messages, placeholder)
 
+    # Tool-iteration loop
     max_tool_iters = 10
     tool_iters = 0
 
-    @traceable(name="tool:execute_tool_call")
-    def execute_tool_call(tool_call) -> Dict[str, Any]:
-        name = tool_call.function.name
-        args = json.loads(tool_call.function.arguments or "{}")
-
-        if name == "internal_plan":
-            return {"received_plan": True, "plan": args}
-        if name == "get_business_info":
-            keys = args.get("keys", [])
-            return get_business_info(keys)
-        if name == "get_services":
-            names = args.get("names")
-            return get_services(names)
-        if name == "get_now":
-            return get_now()
-        if name == "get_hours":
-            return get_hours(args.get("date_phrase"))
-        if name == "check_availability":
-            return check_availability(
-                date_phrase=args.get("date_phrase"),
-                service_name=args.get("service_name"),
-                limit=int(args.get("limit", 8)),
-            )
-        if name == "book_appointment":
-            return book_appointment(
-                date_str=args.get("date_str"),
-                start_time=args.get("start_time"),
-                service_name=args.get("service_name"),
-                client_name=args.get("client_name"),
-                phone=args.get("phone"),
-                email=args.get("email"),
-            )
-        if name == "get_conversation_state":
-            return get_conversation_state()
-        if name == "update_conversation_state":
-            return update_conversation_state(**{k: v for k, v in args.items()})
-        if name == "normalize_and_store_date":
-            return normalize_and_store_date(args.get("date_phrase", ""))
-
-        return {"error": f"Unknown tool {name}"}
-
-    while getattr(message, "tool_calls", None) and tool_iters < max_tool_iters:
-        # run every tool call returned in this message
+    calls = message.tool_calls
+    while calls and tool_iters < max_tool_iters:
+        # run every tool call returned in this message (concurrently)
         tc_blocks = []
         tool_results = []
-        for tool_call in message.tool_calls:
-            payload = execute_tool_call(tool_call)
+        payloads = await _dispatch_all(calls)
+        for tool_call, payload in zip(calls, payloads):
             tool_iters += 1
+            name = tool_call.function.name
             tc_blocks.append({
                 "id": tool_call.id,
                 "type": "function",
                 "function": {
-                    "name": tool_call.function.name,
+                    "name": name,
                     "arguments": tool_call.function.arguments,
                 },
             })
             tool_results.append({
                 "role": "tool",
                 "tool_call_id": tool_call.id,
-                "name": tool_call.function.name,
-                "content": json.dumps(payload, ensure_ascii=False),
+                "name": name,
+                "content": _TINY_ACKS.get(name) or _dumps(payload),
             })
 
-        interim_messages.extend([
-            {"role": "assistant", "tool_calls": tc_blocks},
+        messages.extend([
+            {"role": "assistant", "tool_calls": tc_blocks, **({"content": message.content} if message.content else {})},
             *tool_results,
         ])
 
-        follow = _llm_call(
-            model=MODEL,
-            messages=interim_messages,
+        follow = await _llm_call(
+            model=_pick_model(),
+            messages=messages,
             tools=TOOLS,
             temperature=0.6,
         )
-        message = follow.choices[0].message
+        message = await _collect_stream(follow, placeholder)
+        calls = message.tool_calls
+
+    return message.content or "(no content)"
+
+# ─────────────────────────────────────────────────────────────────────────────
+# UI: Chat (with conversation loop + internal planning)
+# ─────────────────────────────────────────────────────────────────────────────
+st.title("💇‍♀️ Sunny — Salon Receptionist")
+
+with st.sidebar:
+    st.markdown("### Owner/Admin")
+    admin_panel()
+
+# Keep message history bounded to avoid token bloat: past MAX_HISTORY messages or
+# ~MAX_HISTORY_TOKENS estimated tokens, everything but the last ~HISTORY_KEEP_RECENT
+# messages is folded into one summary message.
+MAX_HISTORY = 30
+MAX_HISTORY_TOKENS = 6000
+HISTORY_KEEP_RECENT = 10
+
+def _estimate_tokens(msgs: List[Dict[str, Any]]) -> int:
+    """Rough size of the non-system history (~4 chars per token), tool-call arguments included."""
+    chars = 0
+    for m in msgs:
+        chars += len(m.get("content") or "")
+        for tc in m.get("tool_calls") or ():
+            chars += len(tc["function"]["arguments"] or "")
+    return chars // 4
+
+def _start_compaction(msgs: List[Dict[str, Any]]) -> None:
+    """
+    If the history is over budget, summarize the oldest turns on a worker thread;
+    _finish_compaction swaps the summary in on a later turn, so the summary call
+    never holds up a reply or the next input. Cuts only right before a user message
+    so tool results are never separated from their assistant tool_calls.
+    """
+    if "_pending_summary" in st.session_state:
+        return
+    head = len(SYSTEM_MESSAGES)
+    if len(msgs) <= MAX_HISTORY and _estimate_tokens(msgs[head:]) <= MAX_HISTORY_TOKENS:
+        return
+    # Keep at least the last HISTORY_KEEP_RECENT messages, starting at a user message;
+    # if one tool-heavy turn fills that window, keep just the latest turn.
+    cut = next((i for i in range(len(msgs) - HISTORY_KEEP_RECENT, head, -1)
+                if msgs[i]["role"] == "user"), None)
+    if cut is None:
+        cut = next((i for i in range(len(msgs) - 1, head, -1)
+                    if msgs[i]["role"] == "user"), None)
+    if cut is None:
+        return
+    fut = _tool_executor().submit(_summarize_messages, _background_client(), msgs[head:cut])
+    st.session_state["_pending_summary"] = (msgs[cut], fut)
+
+def _finish_compaction(msgs: List[Dict[str, Any]]) -> None:
+    """
+    Replace the summarized turns with one system message placed right after
+    SYSTEM_MESSAGES (so the static prefix stays cacheable) once the background
+    summary is ready; never waits for it.
+    """
+    pending = st.session_state.get("_pending_summary")
+    if pending is None or not pending[1].done():
+        return
+    del st.session_state["_pending_summary"]
+    boundary, fut = pending
+    head = len(SYSTEM_MESSAGES)
+    # The transcript only grows between compactions, so the summarized span still
+    # ends right before the same user message
+    cut = next((i for i in range(head, len(msgs)) if msgs[i] is boundary), None)
+    if cut is None:
+        return
+    try:
+        summary = fut.result()
+    except Exception:
+        summary = ""  # still drop the old turns; the dialogue slots keep the essentials
+    msgs[head:cut] = [{"role": "system", "content": f"Prior conversation summary: {summary}"}] if summary else []
+
+# Append-only transcript sent to the API verbatim (system prefix first), so each
+# request shares the longest possible cached prefix with the previous one.
+if "messages" not in st.session_state:
+    st.session_state.messages = [
+        *SYSTEM_MESSAGES,
+        {"role": "assistant", "content": "Hi there! I’m Sunny, your friendly salon receptionist. How can I help today?"}
+    ]
+
+# What the chat shows: (role, text) bubbles, appended as the turn happens so a rerun
+# redraws them without rescanning system prompts and tool traffic. Kept apart from
+# the transcript, so history compaction doesn't remove bubbles the user already saw.
+# (Streamlit clears the page on every rerun, so the bubbles themselves are re-emitted.)
+if "chat_log" not in st.session_state:
+    st.session_state.chat_log = [
+        (m["role"], m["content"]) for m in st.session_state.messages
+        if m["role"] in ("user", "assistant") and m.get("content")
+    ]
+
+for role, text in st.session_state.chat_log:
+    with st.chat_message(role):
+        st.markdown(text)
+
+user_text = st.chat_input("Type your message")
+if user_text:
+    messages = st.session_state.messages
+    _finish_compaction(messages)
+    messages.append({"role": "user", "content": user_text})
+    st.session_state.chat_log.append(("user", user_text))
+
+    with st.chat_message("user"):
+        st.markdown(user_text)
+
+    # Reply bubble up front so streamed tokens render as they arrive
+    assistant_box = st.chat_message("assistant")
+    reply_placeholder = assistant_box.empty()
+
+    try:
+        assistant_text = _session_loop().run_until_complete(run_turn(messages, reply_placeholder))
+    except Exception as e:
+        assistant_box.error(f"Model error: {e}")
+        st.stop()
 
-    assistant_text = message.content or "(no content)"
+    messages.append({"role": "assistant", "content": assistant_text})
+    st.session_state.chat_log.append(("assistant", assistant_text))
+    reply_placeholder.markdown(assistant_text)
 
-    st.session_state.messages.append({"role": "assistant", "content": assistant_text})
-    with st.chat_message("assistant"):
-        st.markdown(assistant_text)
+    # Summarizes in the background; applied at the start of a later turn
+    _start_compaction(messages)
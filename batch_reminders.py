@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# python batch_reminders.py submit            # queue reminders for tomorrow's bookings
+# python batch_reminders.py collect --wait    # fetch finished reminders into reminders.json
+"""
+Offline reminder generation for next-day appointments via the OpenAI Batch API.
+
+Runs outside the Streamlit app (e.g. from cron): batch requests are billed at a
+discount and complete within 24h, so none of this touches Sunny's live latency.
+"""
+import os
+import json
+import time
+import argparse
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+try:
+    from zoneinfo import ZoneInfo
+except Exception:
+    raise SystemExit("Python 3.9+ with zoneinfo is required.")
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Config (same env names as app.py)
+# ─────────────────────────────────────────────────────────────────────────────
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+MODEL = os.getenv("OPENAI_MODEL_SMALL") or "gpt-4o-mini"
+BUSINESS_FILE = os.getenv("BUSINESS_INFO_FILE") or "business_info.json"
+WORKING_FILE = os.getenv("WORKING_HOURS_FILE") or "working_hours.json"
+BOOKINGS_FILE = os.getenv("BOOKINGS_FILE") or "bookings.jsonl"
+REMINDERS_FILE = os.getenv("REMINDERS_FILE") or "reminders.json"
+
+REMINDER_PROMPT = """
+Write a short, friendly SMS reminder (max 300 characters) from a hair salon to a client
+about their upcoming appointment. Include the salon name, service, start time, and the
+day: say it as given in "when" (e.g. "tomorrow"), with the date. Plain text only, no
+placeholders.
+""".strip()
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Files
+# ─────────────────────────────────────────────────────────────────────────────
+def _read_json(path: str, default: Any) -> Any:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+def _write_json(path: str, payload: Any) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def load_bookings(path: str) -> List[Dict[str, Any]]:
+    """Bookings in file order (JSONL, or the legacy {"bookings": [...]} document)."""
+    if not os.path.exists(path):
+        return []
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    return _read_json(path, {}).get("bookings", [])
+
+def load_reminders() -> Dict[str, Any]:
+    data = _read_json(REMINDERS_FILE, {})
+    data.setdefault("batches", {})
+    data.setdefault("reminders", {})
+    return data
+
+def _salon_tz() -> ZoneInfo:
+    wh = _read_json(WORKING_FILE, {})
+    biz = _read_json(BUSINESS_FILE, {})
+    try:
+        return ZoneInfo(wh.get("timezone") or biz.get("Timezone") or "America/New_York")
+    except Exception:
+        return ZoneInfo("America/New_York")
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Batch build / submit / collect
+# ─────────────────────────────────────────────────────────────────────────────
+def _relative_day(target_date: str) -> str:
+    """How the SMS should name the day, relative to today in the salon timezone."""
+    today = datetime.now(_salon_tz()).date()
+    day = datetime.strptime(target_date, "%Y-%m-%d").date()
+    delta = (day - today).days
+    if delta == 0:
+        return "today"
+    if delta == 1:
+        return "tomorrow"
+    return "on " + day.strftime("%A")
+
+def build_requests(target_date: str) -> List[Dict[str, Any]]:
+    """
+    One /v1/chat/completions request per booking on `target_date`.
+    custom_id = "<date>T<start>#<line>" — the bookings file is append-only, so the
+    line number is a stable id.
+    """
+    biz = _read_json(BUSINESS_FILE, {})
+    salon = biz.get("Business Name") or "your salon"
+    when = None
+    lines = []
+    for i, rec in enumerate(load_bookings(BOOKINGS_FILE)):
+        if rec.get("date") != target_date:
+            continue
+        when = when or _relative_day(target_date)
+        details = {
+            "salon": salon,
+            "client_name": (rec.get("client") or {}).get("name"),
+            "service": rec.get("service"),
+            "date": rec.get("date"),
+            "when": when,
+            "start": rec.get("start"),
+            "salon_phone": biz.get("Phone") or None,
+        }
+        lines.append({
+            "custom_id": f"{rec.get('date')}T{rec.get('start')}#{i}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": MODEL,
+                "messages": [
+                    {"role": "system", "content": REMINDER_PROMPT},
+                    {"role": "user", "content": json.dumps(details, ensure_ascii=False, separators=(",", ":"))},
+                ],
+                "temperature": 0.6,
+            },
+        })
+    return lines
+
+def submit(client: OpenAI, target_date: str) -> Optional[str]:
+    requests = build_requests(target_date)
+    if not requests:
+        print(f"No bookings on {target_date}; nothing to submit.")
+        return None
+
+    payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in requests)
+    upload = client.files.create(
+        file=(f"reminders-{target_date}.jsonl", payload.encode("utf-8")),
+        purpose="batch",
+    )
+    batch = client.batches.create(
+        input_file_id=upload.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+        metadata={"job": "reminders", "date": target_date},
+    )
+
+    data = load_reminders()
+    data["batches"][batch.id] = {"date": target_date, "status": batch.status, "count": len(requests)}
+    _write_json(REMINDERS_FILE, data)
+    print(f"Submitted batch {batch.id} with {len(requests)} reminder(s) for {target_date}.")
+    return batch.id
+
+def collect(client: OpenAI, batch_id: str) -> bool:
+    """Write finished reminders into reminders.json. Returns True once the batch is final."""
+    batch = client.batches.retrieve(batch_id)
+    data = load_reminders()
+    entry = data["batches"].setdefault(batch_id, {})
+    entry["status"] = batch.status
+
+    if batch.status == "completed" and batch.output_file_id:
+        text = client.files.content(batch.output_file_id).text
+        missing = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            body = (row.get("response") or {}).get("body") or {}
+            choices = body.get("choices") or []
+            content = (choices[0].get("message") or {}).get("content") if choices else None
+            if content:
+                data["reminders"][row["custom_id"]] = content.strip()
+            else:  # refusal or error row: record it and keep the rest of the batch
+                missing.append(row.get("custom_id"))
+        if missing:
+            entry["missing"] = missing
+        if batch.error_file_id:
+            entry["error_file_id"] = batch.error_file_id
+
+    _write_json(REMINDERS_FILE, data)
+    print(f"Batch {batch_id}: {batch.status}")
+    return batch.status in ("completed", "failed", "expired", "cancelled")
+
+def pending_batches() -> List[str]:
+    final = ("completed", "failed", "expired", "cancelled")
+    return [bid for bid, b in load_reminders()["batches"].items() if b.get("status") not in final]
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CLI
+# ─────────────────────────────────────────────────────────────────────────────
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate appointment reminders with the OpenAI Batch API.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_submit = sub.add_parser("submit", help="Queue reminders for one day's bookings.")
+    p_submit.add_argument("--date", help="YYYY-MM-DD (default: tomorrow in the salon timezone)")
+
+    p_collect = sub.add_parser("collect", help="Fetch results of submitted batches.")
+    p_collect.add_argument("batch_id", nargs="?", help="Batch id (default: every unfinished batch)")
+    p_collect.add_argument("--wait", action="store_true", help="Poll until the batches finish.")
+    p_collect.add_argument("--interval", type=int, default=60, help="Seconds between polls with --wait.")
+
+    args = parser.parse_args()
+    if not OPENAI_API_KEY:
+        raise SystemExit("Missing OPENAI_API_KEY.")
+    client = OpenAI(api_key=OPENAI_API_KEY)
+
+    if args.cmd == "submit":
+        target = args.date
+        if not target:
+            target = (datetime.now(_salon_tz()) + timedelta(days=1)).strftime("%Y-%m-%d")
+        submit(client, target)
+        return
+
+    ids = [args.batch_id] if args.batch_id else pending_batches()
+    if not ids:
+        print("No unfinished batches.")
+        return
+    while True:
+        ids = [bid for bid in ids if not collect(client, bid)]
+        if not ids or not args.wait:
+            break
+        time.sleep(max(5, args.interval))
+
+if __name__ == "__main__":
+    main()